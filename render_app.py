@@ -1,15 +1,28 @@
 # render_app.py
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, nullcontext
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+from selectolax.parser import HTMLParser
+from cachetools import TTLCache
 from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import multiprocessing
+import orjson
 import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import xxhash
 
 # For summarization
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.lsa import LsaSummarizer
+from sumy.utils import get_stop_words
 import nltk
 
 # ==============================
@@ -21,7 +34,7 @@ except LookupError:
     nltk.download("punkt")
     nltk.download("punkt_tab")
 
-app = FastAPI(title="Guardian AI Render Service")
+app = FastAPI(title="Guardian AI Render Service", default_response_class=ORJSONResponse)
 
 # ==============================
 # CONFIG
@@ -32,14 +45,95 @@ SERP_API_KEY = os.getenv("SERP_API_KEY", "YOUR_SERP_API_KEY")
 
 GOOGLE_LIMIT = 100  # daily free quota
 SERP_LIMIT = 3      # daily fallback quota
+SERP_HEDGE_DELAY = 1.5  # seconds to wait on Google before also asking SerpAPI
+
+SEARCH_TIMEOUT = aiohttp.ClientTimeout(total=5)
+CRAWL_TIMEOUT = aiohttp.ClientTimeout(total=8)
+MAX_CONCURRENT_CRAWLS = 10
+MAX_PAGE_BYTES = 512_000  # stop reading page bodies past this size
+MAX_PARAGRAPHS = 200  # paragraphs extracted per page
+MIN_SUMMARY_CHARS = 500  # shorter text is returned as-is
+MAX_SUMMARY_CHARS = 12_000  # text fed to the summarizer
+STOPWORDS = frozenset(get_stop_words("english"))
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+RETRY_TOTAL = 2
+RETRY_BACKOFF = 0.3  # seconds, doubled per attempt
+RETRY_STATUSES = {502, 503, 504}
+
+try:
+    CPU_COUNT = len(os.sched_getaffinity(0))  # CPUs this container may use
+except AttributeError:  # not available on macOS/Windows
+    CPU_COUNT = os.cpu_count() or 1
+MAX_SUMMARY_WORKERS = 2  # each worker re-imports the app (~100 MB RSS)
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", min(CPU_COUNT, MAX_SUMMARY_WORKERS)))
+
+CACHE_SIZE = 512
+CACHE_TTL = 3600  # seconds
+
+WARMUP_TIMEOUT = aiohttp.ClientTimeout(total=3)
+WARMUP_URLS = [
+    "https://www.googleapis.com/",
+    "https://serpapi.com/",
+    "https://en.wikipedia.org/",
+    "https://www.cisa.gov/",
+]
+
+STATIC_URLS = [
+    "https://en.wikipedia.org/wiki/Cybersecurity",
+    "https://www.cisa.gov/cybersecurity"
+]
 
 # Usage trackers
 usage = {"google": 0, "serp": 0}
 reset_time = datetime.now() + timedelta(days=1)
 
+# Shared HTTP client and summarizer pool, created on startup
+session = None
+crawl_semaphore = None
+executor = None
+
+# Response caches
+search_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+page_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+summary_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+inflight = {}  # (cache id, key) -> task, so concurrent misses share one fetch
+
 class QuestionRequest(BaseModel):
     question: str
 
+# ==============================
+# LIFECYCLE
+# ==============================
+@app.on_event("startup")
+async def startup():
+    global session, crawl_semaphore, executor
+    connector = aiohttp.TCPConnector(
+        limit=50, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=60
+    )
+    session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+    crawl_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CRAWLS)
+    executor = create_executor()
+    await warm_connections(session)
+
+def create_executor():
+    """Summarizer pool; forkserver avoids forking the threaded event-loop process."""
+    return ProcessPoolExecutor(
+        max_workers=max(1, SUMMARY_WORKERS), mp_context=multiprocessing.get_context("forkserver")
+    )
+
+async def warm_connections(session):
+    """Open pooled connections to upstream hosts so the first request skips DNS/TLS setup."""
+    async def head(url):
+        async with session.head(url, timeout=WARMUP_TIMEOUT):
+            pass
+
+    await asyncio.gather(*(head(url) for url in WARMUP_URLS), return_exceptions=True)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await session.close()
+    executor.shutdown(cancel_futures=True)
+
 # ==============================
 # HELPERS
 # ==============================
@@ -49,87 +143,261 @@ def reset_usage_if_needed():
         usage = {"google": 0, "serp": 0}
         reset_time = datetime.now() + timedelta(days=1)
 
-def search_web(query, num_results=3):
-    """Try Google first, fallback to SerpAPI, then static URLs."""
+@asynccontextmanager
+async def get_with_retry(session, url, limiter=None, **kwargs):
+    """GET with a short backoff on connection errors and 502/503/504 responses.
+
+    The optional limiter (a semaphore) is held for each attempt and while the
+    caller reads the response, but not during backoff sleeps.
+    """
+    limiter = limiter or nullcontext()
+    for attempt in range(RETRY_TOTAL + 1):
+        async with limiter:
+            try:
+                response = await session.get(url, **kwargs)
+            except aiohttp.ClientConnectionError:
+                if attempt == RETRY_TOTAL:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt == RETRY_TOTAL:
+                    async with response:
+                        yield response
+                    return
+                response.release()
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+def canonical_url(url):
+    """Dedup key for a URL: lowercase scheme/host, no fragment or utm_* params.
+
+    Only used for comparison; pages are always fetched from the original URL.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:  # malformed link, e.g. "http://[bad/"; crawl will just fail
+        return url.strip()
+    userinfo, at, hostport = parts.netloc.rpartition("@")
+    netloc = userinfo + at + hostport.lower()  # credentials keep their case
+    query = urlencode([
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.startswith("utm_")
+    ])
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, query, ""))
+
+async def cached_call(cache, key, fetch):
+    """Return cache[key], running fetch() once for all concurrent callers on a miss."""
+    # Only truthy results are stored, so None means a miss
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    inflight_key = (id(cache), key)
+    task = inflight.get(inflight_key)
+    if task is None:
+        async def run():
+            result = await fetch()
+            if result:
+                cache[key] = result
+            return result
+
+        task = asyncio.ensure_future(run())
+        inflight[inflight_key] = task
+        task.add_done_callback(lambda _: inflight.pop(inflight_key, None))
+    return await asyncio.shield(task)
+
+async def search_web(session, query, num_results=3):
+    """Search the web, caching results per query, then fall back to static URLs."""
+    urls = await cached_call(
+        search_cache,
+        (query.lower(), num_results),
+        lambda: query_search_apis(session, query, num_results),
+    )
+    return urls or STATIC_URLS[:num_results]
+
+async def query_search_apis(session, query, num_results=3):
+    """Try Google first; start SerpAPI only if Google fails or is slow."""
     reset_usage_if_needed()
-    urls = []
-
-    # 1. Google Programmable Search API
-    if usage["google"] < GOOGLE_LIMIT:
-        try:
-            params = {"q": query, "key": GOOGLE_API_KEY, "cx": GOOGLE_CX, "num": num_results}
-            r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=5)
-            results = r.json().get("items", [])
-            urls = [item["link"] for item in results if "link" in item]
-            if urls:
-                usage["google"] += 1
-                return urls[:num_results]
-        except Exception:
-            pass
+    tasks = []  # in preference order
+    pending = set()
+    try:
+        # 1. Google Programmable Search API
+        if usage["google"] < GOOGLE_LIMIT:
+            usage["google"] += 1  # counted when sent, as the API bills it
+            google = asyncio.create_task(google_search(session, query, num_results))
+            tasks.append(google)
+            done, pending = await asyncio.wait({google}, timeout=SERP_HEDGE_DELAY)
+            if google in done and google.result():
+                return google.result()
 
-    # 2. SerpAPI fallback
-    if usage["serp"] < SERP_LIMIT:
-        try:
-            params = {"q": query, "api_key": SERP_API_KEY, "num": num_results}
-            r = requests.get("https://serpapi.com/search", params=params, timeout=5)
-            results = r.json().get("organic_results", [])
-            urls = [r["link"] for r in results if "link" in r]
-            if urls:
-                usage["serp"] += 1
-                return urls[:num_results]
-        except Exception:
-            pass
+        # 2. SerpAPI fallback, hedging a slow Google call
+        if usage["serp"] < SERP_LIMIT:
+            usage["serp"] += 1
+            serp = asyncio.create_task(serp_search(session, query, num_results))
+            tasks.append(serp)
+            pending.add(serp)
 
-    # 3. Both quotas exhausted → fallback to static
-    return [
-        "https://en.wikipedia.org/wiki/Cybersecurity",
-        "https://www.cisa.gov/cybersecurity"
-    ][:num_results]
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task in done and task.result():
+                    return task.result()
+    finally:
+        # Drop the slower search once we have an answer
+        for task in pending:
+            task.cancel()
 
-def crawl_page(url):
+    # 3. Both quotas exhausted or no results
+    return []
+
+async def google_search(session, query, num_results=3):
+    """Google Programmable Search API."""
     try:
-        response = requests.get(url, timeout=5)
-        if response.status_code != 200:
-            return ""
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        text = " ".join([p.get_text() for p in paragraphs])
-        return text
-    except:
+        params = {"q": query, "key": GOOGLE_API_KEY, "cx": GOOGLE_CX, "num": num_results}
+        async with get_with_retry(session, "https://www.googleapis.com/customsearch/v1", params=params, timeout=SEARCH_TIMEOUT) as r:
+            results = orjson.loads(await r.read()).get("items", [])
+        urls = [item["link"] for item in results if "link" in item]
+        return urls[:num_results]
+    except Exception:
+        return []
+
+async def serp_search(session, query, num_results=3):
+    """SerpAPI search."""
+    try:
+        params = {"q": query, "api_key": SERP_API_KEY, "num": num_results}
+        async with get_with_retry(session, "https://serpapi.com/search", params=params, timeout=SEARCH_TIMEOUT) as r:
+            results = orjson.loads(await r.read()).get("organic_results", [])
+        urls = [r["link"] for r in results if "link" in r]
+        return urls[:num_results]
+    except Exception:
+        return []
+
+async def crawl_page(session, url):
+    """Fetch a page's paragraph text, served from cache when possible."""
+    return await cached_call(page_cache, url.strip(), lambda: fetch_page(session, url))
+
+async def fetch_page(session, url):
+    try:
+        async with get_with_retry(
+            session, url, limiter=crawl_semaphore, timeout=CRAWL_TIMEOUT
+        ) as response:
+            if response.status != 200:
+                return ""
+            if not response.headers.get("Content-Type", "").startswith("text/"):
+                return ""
+            charset = response.charset
+            html = bytearray()
+            async for chunk in response.content.iter_chunked(16384):
+                html += chunk
+                if len(html) >= MAX_PAGE_BYTES:
+                    break
+        html = bytes(html)
+        # Honour the header charset; otherwise let selectolax sniff meta tags
+        if charset:
+            try:
+                html = html.decode(charset, errors="replace")
+            except LookupError:
+                pass
+        tree = HTMLParser(html)
+        for node in tree.css("script,style,noscript,header,footer,nav,aside"):
+            node.decompose()
+        paragraphs = tree.css("p")[:MAX_PARAGRAPHS]
+        text = " ".join(p.text(separator=" ", strip=True) for p in paragraphs)
+        # Only the summarized prefix is ever used; keep cached pages small
+        return truncate_text(text)
+    except Exception:
         return ""
 
+async def summarize_page(text, sentences_count=3):
+    """Summarize text in the process pool, caching by content hash."""
+    global executor
+    if len(text) < MIN_SUMMARY_CHARS:
+        return text.strip()
+
+    # LSA runs an SVD over a terms x sentences matrix; bound its size
+    text = truncate_text(text)
+
+    key = (hashlib.blake2b(text.encode(), digest_size=16).hexdigest(), sentences_count)
+    pool = executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await cached_call(
+            summary_cache,
+            key,
+            lambda: loop.run_in_executor(pool, summarize_text, text, sentences_count),
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); replace the pool once and don't cache the fallback
+        if executor is pool:
+            print("Summarizer pool broke, restarting it")
+            executor = create_executor()
+            pool.shutdown(wait=False)
+        return first_sentences(text, sentences_count)
+
+@lru_cache(maxsize=None)
+def get_summarizer():
+    """Build the tokenizer and LSA summarizer once per process, on first use.
+
+    Loading punkt can fail (no NLTK data); doing it lazily keeps that inside
+    summarize_text's fallback instead of breaking import. Failures aren't
+    cached, so the next call retries.
+    """
+    summarizer = LsaSummarizer()
+    summarizer.stop_words = STOPWORDS
+    return Tokenizer("english"), summarizer
+
 def summarize_text(text, sentences_count=3):
     """Summarize text using Sumy LSA."""
     try:
-        parser = PlaintextParser.from_string(text, Tokenizer("english"))
-        summarizer = LsaSummarizer()
+        tokenizer, summarizer = get_summarizer()
+        parser = PlaintextParser.from_string(text, tokenizer)
         summary = summarizer(parser.document, sentences_count)
         return " ".join(str(sentence) for sentence in summary)
     except Exception as e:
         print(f"Summarization failed: {e}")
-        # fallback: return first 3 sentences if summarization fails
-        return " ".join(text.split(". ")[:3])
+        # fallback: return first sentences if summarization fails
+        return first_sentences(text, sentences_count)
+
+def truncate_text(text, limit=MAX_SUMMARY_CHARS):
+    """Cut text at the last sentence end before limit characters."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(". ", 0, limit)
+    return text[:cut + 1] if cut > 0 else text[:limit]
+
+def first_sentences(text, count=3):
+    return " ".join(text.split(". ", count)[:count])
 
 # ==============================
 # ENDPOINT
 # ==============================
 @app.post("/answer")
-def get_answer(data: QuestionRequest):
+async def get_answer(data: QuestionRequest):
     try:
         question = data.question.strip()
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty.")
 
-        search_urls = search_web(question)
+        search_urls = await search_web(session, question)
 
         if not search_urls:
             return {"answer": "Sorry, I could not find any information."}
 
-        # Crawl & summarize
+        # Crawl each distinct URL concurrently, then summarize in order
+        unique_urls = {}
         for url in search_urls:
-            page_text = crawl_page(url)
-            if page_text:
-                summary = summarize_text(page_text)
+            unique_urls.setdefault(canonical_url(url), url)
+        search_urls = list(unique_urls.values())
+        pages = await asyncio.gather(
+            *(crawl_page(session, url) for url in search_urls), return_exceptions=True
+        )
+        seen = set()
+        for page_text in pages:
+            if isinstance(page_text, str) and page_text:
+                # Skip mirrored copies of a page we already tried
+                digest = xxhash.xxh3_64(page_text[:4096].encode()).intdigest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                summary = await summarize_page(page_text)
                 if summary:
                     return {"answer": summary}
 